@@ -1,12 +1,23 @@
 import asyncio
-import base64
-import json
+import atexit
+import functools
+import hashlib
 import os
+import queue
 import warnings
 import logging
+import logging.handlers
 from pathlib import Path
 from dotenv import load_dotenv
-from contextlib import suppress
+
+with warnings.catch_warnings():
+    # Deprecated in the stdlib; provided by audioop-lts on Python 3.13+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    import audioop
+
+import orjson
+import ormsgpack
+import pybase64
 
 from google.genai.types import (
     Part,
@@ -18,13 +29,13 @@ from google.adk.runners import InMemoryRunner
 from google.adk.agents import LiveRequestQueue
 from google.adk.agents.run_config import RunConfig
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import uvicorn
 
 from myAgents.agent import root_agent
-from myAgents.state_schema import StateManager, ALIASessionState
+from myAgents.state_schema import StateManager
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
@@ -48,20 +59,160 @@ else:
     if os.getenv("GOOGLE_API_KEY"):
         os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
-# Configure logging with environment variable
+# Configure logging with environment variable. Log calls only enqueue the
+# record; the console and file handlers run on a QueueListener thread so
+# the event loop never blocks on log I/O.
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - PHYSIO_AI - %(message)s')
+log_handlers = [
+    logging.StreamHandler(),
+    logging.FileHandler('physio_ai.log')
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 logging.basicConfig(
     level=os.getenv('LOG_LEVEL', 'INFO').upper(),
-    format='%(asctime)s - %(name)s - %(levelname)s - PHYSIO_AI - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('physio_ai.log')
-    ]
+    format='%(message)s',
+    handlers=[logging.handlers.QueueHandler(log_queue)]
 )
 
 logger = logging.getLogger(__name__)
 
 APP_NAME = "Physio AI"
 STATIC_DIR = Path("static")
+INDEX_PATH = str(STATIC_DIR / "index.html")
+
+# Attach a state summary to every turn message (debugging aid, off by default)
+STATE_BROADCAST = os.getenv("PHYSIO_AI_STATE_BROADCAST", "FALSE").upper() == "TRUE"
+
+# Binary websocket frames carry raw media behind a one-byte type tag.
+# JSON messages are sent as-is and start with "{", and MessagePack maps
+# start with 0x8X, so neither needs a tag.
+FRAME_JSON = 0x7B
+FRAME_MSGPACK_MAPS = range(0x80, 0x90)
+FRAME_AUDIO_PCM = 0x01
+FRAME_IMAGE_JPEG = 0x02
+FRAME_IMAGE_PNG = 0x03
+FRAME_IMAGE_WEBP = 0x04
+FRAME_VIDEO_WEBM = 0x05
+FRAME_VIDEO_MP4 = 0x06
+FRAME_AUDIO_PCMU = 0x07  # 8-bit G.711 mu-law, half the size of 16-bit PCM
+FRAME_MIME_TYPES = {
+    FRAME_AUDIO_PCM: "audio/pcm",
+    FRAME_AUDIO_PCMU: "audio/pcm",  # expanded to 16-bit PCM on arrival
+    FRAME_IMAGE_JPEG: "image/jpeg",
+    FRAME_IMAGE_PNG: "image/png",
+    FRAME_IMAGE_WEBP: "image/webp",
+    FRAME_VIDEO_WEBM: "video/webm",
+    FRAME_VIDEO_MP4: "video/mp4",
+}
+
+# Agent audio frame tags by the ?audio_codec= a client asks for
+AUDIO_FRAME_TAGS = {
+    "pcm": bytes([FRAME_AUDIO_PCM]),
+    "pcmu": bytes([FRAME_AUDIO_PCMU]),
+}
+
+# Encoders for JSON-shaped messages, selected per connection with ?codec=
+# or by negotiating the "msgpack" websocket subprotocol
+MESSAGE_ENCODERS = {
+    "json": orjson.dumps,
+    "msgpack": ormsgpack.packb,
+}
+
+# Agent text messages, encoded without building the envelope dict; for
+# JSON only the text itself goes through the encoder
+JSON_TEXT_PREFIX = b'{"mime_type":"text/plain","data":'
+
+def _encode_json_text(text: str) -> bytes:
+    return JSON_TEXT_PREFIX + orjson.dumps(text) + b"}"
+
+def _encode_msgpack_text(text: str) -> bytes:
+    return ormsgpack.packb({"mime_type": "text/plain", "data": text})
+
+TEXT_ENCODERS = {
+    "json": _encode_json_text,
+    "msgpack": _encode_msgpack_text,
+}
+
+# Decoders for untagged binary frames, by first byte
+FRAME_DECODERS = {
+    FRAME_JSON: orjson.loads,
+    **{first_byte: ormsgpack.unpackb for first_byte in FRAME_MSGPACK_MAPS},
+}
+
+# Turn boundary messages, pre-encoded once per codec for every
+# (turn_complete, interrupted) combination
+TURN_FLAG_VALUES = (True, False, None)
+TURN_FRAMES = {
+    codec: {
+        (turn_complete, interrupted): encode({"turn_complete": turn_complete, "interrupted": interrupted})
+        for turn_complete in TURN_FLAG_VALUES
+        for interrupted in TURN_FLAG_VALUES
+    }
+    for codec, encode in MESSAGE_ENCODERS.items()
+}
+
+# Streamed text is held back briefly so consecutive chunks share one frame:
+# flushed at this many characters, after this many seconds, or as soon as
+# a non-text message (audio, turn_complete, ...) is queued behind it
+TEXT_FLUSH_SIZE = 4 * 1024
+TEXT_FLUSH_INTERVAL = 0.02
+
+# Maximum number of messages waiting for the client writer per connection
+OUTBOUND_QUEUE_SIZE = 256
+
+def _user_text(data: str, _content=Content, _from_text=Part.from_text) -> Content:
+    """Wrap text as user content; constructors are bound as fast locals"""
+    return _content(role="user", parts=[_from_text(text=data)])
+
+# Media blobs are always built from bytes and a known mime type string, so
+# they skip pydantic validation
+_media_blob = Blob.model_construct
+
+def _forward_blob(live_request_queue, mime_type: str, data: str | bytes) -> int:
+    """Decode a base64 media payload and stream it to the agent"""
+    # MessagePack messages carry the media as raw bytes already
+    decoded_data = data if isinstance(data, bytes) else pybase64.b64decode(data, validate=False)
+    live_request_queue.send_realtime(_media_blob(data=decoded_data, mime_type=mime_type))
+    return len(decoded_data)
+
+# Handlers for JSON media messages by exact mime type, then by prefix.
+# Text is handled inline.
+MESSAGE_HANDLERS = {
+    "audio/pcm": _forward_blob,
+    "image/jpeg": _forward_blob,
+}
+MESSAGE_PREFIX_HANDLERS = (
+    ("image/", _forward_blob),
+    ("video/", _forward_blob),
+)
+
+@functools.lru_cache(maxsize=32)
+def _message_handler(mime_type: str):
+    """Resolve the handler for a media mime type, or None if unsupported"""
+    handler = MESSAGE_HANDLERS.get(mime_type)
+    if handler is None:
+        handler = next((h for prefix, h in MESSAGE_PREFIX_HANDLERS if mime_type.startswith(prefix)), None)
+    return handler
+
+@functools.lru_cache(maxsize=64)
+def _encode_state_turn(codec: str, turn_complete, interrupted, stage: str, summary: str) -> bytes:
+    """Encode a turn message with a state update attached; repeats reuse the bytes"""
+    return MESSAGE_ENCODERS[codec]({
+        "turn_complete": turn_complete,
+        "interrupted": interrupted,
+        "state": {
+            "type": "state_update",
+            "stage": stage,
+            "summary": summary
+        }
+    })
 
 # Global runner instance
 runner = None
@@ -69,6 +220,9 @@ runner = None
 async def initialize_adk_system():
     """Initialize the ADK system with proper error handling"""
     global runner
+    if runner is not None:
+        logger.info("ADK Runner already initialized, reusing it")
+        return
     try:
         runner = InMemoryRunner(
             app_name=APP_NAME,
@@ -91,6 +245,8 @@ async def startup_event():
     logger.info(f"  - Project: {os.getenv('GOOGLE_CLOUD_PROJECT', 'Not set')}")
     logger.info(f"  - Location: {os.getenv('GOOGLE_CLOUD_LOCATION', 'Not set')}")
     logger.info(f"  - Credentials: {os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'Not set')}")
+    loop = asyncio.get_running_loop()
+    logger.info(f"  - Event loop: {type(loop).__module__}.{type(loop).__name__}")
     
     await initialize_adk_system()
     if not runner:
@@ -100,17 +256,36 @@ async def startup_event():
 
 # Updated WebSocket endpoint with better session handling
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: str = "false", enable_video: str = "false"):
+async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: str = "false", enable_video: str = "false", codec: str = "json", audio_codec: str = "pcm"):
     """Client websocket endpoint with improved error handling"""
-    await websocket.accept()
-    logger.info(f"[{session_id}] Client connected, audio mode: {is_audio}, video mode: {enable_video}")
+    # Clients offering the "msgpack" subprotocol get MessagePack messages
+    subprotocol = "msgpack" if "msgpack" in websocket.scope.get("subprotocols", ()) else None
+    if subprotocol:
+        codec = subprotocol
+
+    # No TCP_NODELAY tweak needed: both asyncio and uvloop set it on every
+    # accepted TCP transport, so small text/control frames go out immediately.
+    await websocket.accept(subprotocol=subprotocol)
+    logger.info("[%s] Client connected, audio mode: %s, video mode: %s, codec: %s", session_id, is_audio, enable_video, codec)
+
+    if codec not in MESSAGE_ENCODERS:
+        codec = "json"
+    encode = MESSAGE_ENCODERS[codec]
+    encode_text = TEXT_ENCODERS[codec]
+    turn_frames = TURN_FRAMES[codec]
+
+    if audio_codec not in AUDIO_FRAME_TAGS:
+        audio_codec = "pcm"
+    audio_frame_tag = AUDIO_FRAME_TAGS[audio_codec]
+    audio_mulaw = audio_codec == "pcmu"
 
     if not runner:
-        logger.error(f"[{session_id}] Runner not initialized. Aborting connection.")
+        logger.error("[%s] Runner not initialized. Aborting connection.", session_id)
         await websocket.close(code=1011, reason="Server not ready")
         return
 
     session = None
+    alia_state = None
     live_request_queue = None
     
     try:
@@ -123,19 +298,35 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: st
             user_id=user_id_str,
         )
 
-        # Initialize ALIA state
-        initial_state = StateManager.create_initial_state(
+        # Initialize ALIA state. This object stays live for the connection:
+        # user messages mutate it in place and only the fields they change
+        # (interaction tracking, never the callback-owned stage) are flushed
+        # to session.state at turn boundaries.
+        alia_state = StateManager.create_initial_state(
             user_id=user_id_str, 
             session_id=session.id
         )
-        session.state.update(initial_state.to_dict())
-        logger.info(f"[{session_id}] Session created with initial state: {initial_state.get_summary()}")
+        session.state.update(alia_state.to_dict())
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[%s] Session created with initial state: %s", session_id, alia_state.get_summary())
 
         # Set response modalities
         modalities = ["AUDIO"] if is_audio == "true" else ["TEXT"]
         run_config = RunConfig(response_modalities=modalities)
         
         live_request_queue = LiveRequestQueue()
+        # Messages for the client, sent by a single writer task. The queue is
+        # bounded so a slow client back-pressures the agent stream instead of
+        # buffering without limit. agent_to_client queues end_of_stream when
+        # the stream ends so the writer flushes and exits.
+        outbound = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        end_of_stream = object()
+        # Interrupts seen so far; the writer compares it to drop an audio
+        # frame it was holding back when an interrupt arrived
+        interrupt_count = 0
+        
+        def is_audio_frame(message) -> bool:
+            return isinstance(message, bytes) and message[0] == audio_frame_tag[0]
         
         # Use the working approach from your original code
         live_events = runner.run_live(
@@ -146,49 +337,67 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: st
 
         async def agent_to_client():
             """Handle agent to client communication"""
-            logger.debug(f"[{session_id}] Starting agent_to_client task")
+            nonlocal interrupt_count
+            logger.debug("[%s] Starting agent_to_client task", session_id)
             audio_chunk_counter = 0
+            put = outbound.put  # bound once, used for every outbound frame
             
             try:
                 async for event in live_events:
-                    agent_author = getattr(event, 'author', 'unknown')
                     event_processed = False
                     
-                    # Log basic event info (reduced for audio performance)
-                    if not (event.content and event.content.parts and 
+                    # Log basic event info (skipped entirely unless DEBUG is on, and for audio)
+                    if logger.isEnabledFor(logging.DEBUG) and not (
+                           event.content and event.content.parts and 
                            event.content.parts[0].inline_data and 
                            event.content.parts[0].inline_data.mime_type.startswith("audio/")):
-                        logger.debug(f"[{session_id}] 📨 Event from: {agent_author} | Turn Complete: {event.turn_complete} | Partial: {event.partial}")
+                        logger.debug("[%s] 📨 Event from: %s | Turn Complete: %s | Partial: %s",
+                                     session_id, getattr(event, 'author', 'unknown'), event.turn_complete, event.partial)
                     
                     # Handle turn complete or interrupted
                     if event.turn_complete or event.interrupted:
                         if audio_chunk_counter > 0:
-                            logger.info(f"[{session_id}] Finished sending {audio_chunk_counter} audio chunks.")
+                            logger.info("[%s] Finished sending %s audio chunks.", session_id, audio_chunk_counter)
                         audio_chunk_counter = 0
                         
-                        message = {
-                            "turn_complete": event.turn_complete,
-                            "interrupted": event.interrupted,
-                        }
-                        await websocket.send_text(json.dumps(message))
-                        logger.info(f"[{session_id}] 🏁 Turn complete from {agent_author}: {message}")
+                        # The client stops playback on interrupt, so drop any
+                        # agent audio that is still waiting to be sent
+                        if event.interrupted:
+                            interrupt_count += 1
+                            kept = []
+                            while not outbound.empty():
+                                queued = outbound.get_nowait()
+                                if not is_audio_frame(queued):
+                                    kept.append(queued)
+                            for queued in kept:
+                                outbound.put_nowait(queued)
                         
-                        # Send state update
+                        logger.info("[%s] 🏁 Turn complete from %s: turn_complete=%s, interrupted=%s", session_id, getattr(event, 'author', 'unknown'), event.turn_complete, event.interrupted)
+                        
+                        # Flush interaction tracking and attach the state update
+                        # to the turn message, so one frame marks the boundary
+                        turn_frame = None
                         try:
-                            if session.state:
-                                state = ALIASessionState.from_dict(session.state)
-                                logger.info(f"[{session_id}] 📊 State summary: {state.get_summary()}")
-                                state_message = {
-                                    "mime_type": "application/json",
-                                    "data": {
-                                        "type": "state_update",
-                                        "stage": state.conversation_stage.value,
-                                        "summary": state.get_summary()
-                                    }
-                                }
-                                await websocket.send_text(json.dumps(state_message))
+                            StateManager.save_state_to_adk(session, alia_state)
+                            if STATE_BROADCAST and session.state:
+                                summary = StateManager.summary_from_adk(session.state)
+                                logger.info("[%s] 📊 State summary: %s", session_id, summary)
+                                turn_frame = _encode_state_turn(
+                                    codec, event.turn_complete, event.interrupted,
+                                    session.state["conversation_stage"], summary
+                                )
                         except Exception as e:
-                            logger.debug(f"[{session_id}] Could not extract state: {e}")
+                            logger.debug("[%s] Could not extract state: %s", session_id, e)
+                        
+                        if turn_frame is None:
+                            turn_frame = turn_frames.get((event.turn_complete, event.interrupted))
+                        if turn_frame is not None:
+                            await put(turn_frame)
+                        else:
+                            await put({
+                                "turn_complete": event.turn_complete,
+                                "interrupted": event.interrupted,
+                            })
                         
                         event_processed = True
                         continue
@@ -197,152 +406,221 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: st
                     if event.content and event.content.parts:
                         part = event.content.parts[0]
                         
-                        # Audio content
-                        if part.inline_data and part.inline_data.mime_type.startswith("audio/pcm"):
-                            audio_data = part.inline_data.data
+                        inline_data = part.inline_data
+                        
+                        # Audio content (the mime type carries a rate suffix,
+                        # e.g. "audio/pcm;rate=24000", so match the prefix)
+                        if inline_data is not None and inline_data.mime_type.startswith("audio/pcm"):
+                            audio_data = inline_data.data
                             if audio_data:
-                                message = {
-                                    "mime_type": "audio/pcm",
-                                    "data": base64.b64encode(audio_data).decode("ascii")
-                                }
-                                await websocket.send_text(json.dumps(message))
+                                if audio_mulaw:
+                                    audio_data = audioop.lin2ulaw(audio_data, 2)
+                                await put(audio_frame_tag + audio_data)
                                 audio_chunk_counter += 1
                                 if audio_chunk_counter == 1:
-                                    logger.info(f"[{session_id}] Receiving audio stream from ADK...")
-                                logger.debug(f"[{session_id}] Sending audio chunk #{audio_chunk_counter} ({len(audio_data)} bytes) to client.")
+                                    logger.info("[%s] Receiving audio stream from ADK...", session_id)
+                                logger.debug("[%s] Sending audio chunk #%d (%d bytes) to client.", session_id, audio_chunk_counter, len(audio_data))
                                 event_processed = True
 
-                        # Text content
+                        # Text content, queued as the bare string; the writer
+                        # wraps it when encoding
                         elif part.text and event.partial:
-                            message = {
-                                "mime_type": "text/plain",
-                                "data": part.text
-                            }
-                            await websocket.send_text(json.dumps(message))
-                            logger.info(f"[{session_id}] Agent to client - text/plain: {part.text}")
+                            await put(part.text)
+                            logger.debug("[%s] Agent to client - text/plain: %s", session_id, part.text)
                             event_processed = True
 
                     # Tool call and function response logging
                     if not event_processed and not getattr(event, 'actions', None):
                         if event.get_function_calls():
                             for call in event.get_function_calls():
-                                logger.info(f"[{session_id}] 🔧 Tool Call Requested by {event.author}: {call.name}")
-                                logger.debug(f"[{session_id}] Tool Call Details: {call}")
+                                logger.info("[%s] 🔧 Tool Call Requested by %s: %s", session_id, event.author, call.name)
+                                logger.debug("[%s] Tool Call Details: %s", session_id, call)
                         elif event.get_function_responses():
                             for response in event.get_function_responses():
-                                logger.info(f"[{session_id}] 🔧 Tool Response from {event.author}: {response.name}")
-                                logger.debug(f"[{session_id}] Tool Response Details: {response}")
+                                logger.info("[%s] 🔧 Tool Response from %s: %s", session_id, event.author, response.name)
+                                logger.debug("[%s] Tool Response Details: %s", session_id, response)
 
             except WebSocketDisconnect:
-                logger.info(f"[{session_id}] WebSocket disconnected during agent processing")
+                logger.info("[%s] WebSocket disconnected during agent processing", session_id)
             except asyncio.CancelledError:
-                logger.info(f"[{session_id}] Agent to client task cancelled")
+                logger.info("[%s] Agent to client task cancelled", session_id)
+                return
             except Exception as e:
-                logger.error(f"[{session_id}] Error in agent_to_client: {e}")
+                logger.error("[%s] Error in agent_to_client: %s", session_id, e)
+            
+            # Stream ended: let the writer flush what is queued and stop. Not in a
+            # finally block, since waiting for queue space after cancellation
+            # could block teardown when the writer is already gone.
+            await outbound.put(end_of_stream)
+
+        async def client_writer():
+            """Send queued messages to the client, merging queued text chunks into one frame"""
+            logger.debug("[%s] Starting client_writer task", session_id)
+            loop = asyncio.get_running_loop()
+            get = outbound.get
+            send_bytes = websocket.send_bytes
+            held = None
+            held_interrupts = 0
+            try:
+                while True:
+                    if held is not None:
+                        message = held
+                        held = None
+                        # Interrupted while held back behind text: the client
+                        # has already reset playback
+                        if held_interrupts != interrupt_count and is_audio_frame(message):
+                            continue
+                    else:
+                        message = await get()
+                    if message is end_of_stream:
+                        logger.debug("[%s] Agent stream ended, client_writer flushed", session_id)
+                        break
+
+                    # Coalesce text chunks queued behind this one, waiting at most
+                    # TEXT_FLUSH_INTERVAL for more to arrive
+                    if isinstance(message, str):
+                        chunks = [message]
+                        size = len(message)
+                        deadline = loop.time() + TEXT_FLUSH_INTERVAL
+                        while size < TEXT_FLUSH_SIZE:
+                            if outbound.empty():
+                                try:
+                                    async with asyncio.timeout_at(deadline):
+                                        queued = await get()
+                                except TimeoutError:
+                                    break
+                            else:
+                                queued = outbound.get_nowait()
+                            if not isinstance(queued, str):
+                                held = queued
+                                held_interrupts = interrupt_count
+                                break
+                            chunks.append(queued)
+                            size += len(queued)
+                        await send_bytes(encode_text("".join(chunks) if len(chunks) > 1 else message))
+                        continue
+
+                    # Media frames are already encoded; other messages are not
+                    await send_bytes(message if isinstance(message, bytes) else encode(message))
+
+            except WebSocketDisconnect:
+                logger.info("[%s] WebSocket disconnected while sending", session_id)
+            except asyncio.CancelledError:
+                logger.info("[%s] Client writer task cancelled", session_id)
+            except Exception as e:
+                logger.error("[%s] Error in client_writer: %s", session_id, e)
 
         async def client_to_agent():
             """Handle client to agent communication"""
-            logger.debug(f"[{session_id}] Starting client_to_agent task")
+            logger.debug("[%s] Starting client_to_agent task", session_id)
+            receive = websocket.receive
+            send_realtime = live_request_queue.send_realtime
             try:
                 while True:
-                    message_json = await websocket.receive_text()
-                    message = json.loads(message_json)
+                    frame = await receive()
+                    if frame["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(frame.get("code", 1000))
+
+                    payload = frame.get("bytes")
+                    if payload is not None:
+                        # Empty binary frames are legal but carry nothing
+                        if not payload:
+                            logger.debug("[%s] Ignoring empty binary frame", session_id)
+                            continue
+                        # Binary frame: tagged raw media, no base64 or JSON
+                        mime_type = FRAME_MIME_TYPES.get(payload[0])
+                        if mime_type is not None:
+                            data = payload[1:]
+                            if payload[0] == FRAME_AUDIO_PCMU:
+                                data = audioop.ulaw2lin(data, 2)
+                            send_realtime(_media_blob(data=data, mime_type=mime_type))
+                            logger.debug("[%s] Client to agent - %s: %d bytes", session_id, mime_type, len(payload) - 1)
+                            continue
+
+                        # Otherwise a JSON or MessagePack message, parsed straight from bytes
+                        decode = FRAME_DECODERS.get(payload[0])
+                        if decode is None:
+                            logger.warning("[%s] Unknown binary frame tag: %s", session_id, payload[0])
+                            continue
+                        message = decode(payload)
+                    else:
+                        message = orjson.loads(frame["text"])
                     mime_type = message["mime_type"]
                     data = message["data"]
 
-                    logger.info(f"[{session_id}] Client to agent - received: {mime_type}")
-
-                    # Update session state with user message if it's text
-                    if mime_type == "text/plain":
-                        try:
-                            if session.state:
-                                state = ALIASessionState.from_dict(session.state)
-                                state.update_interaction(user_message=data)
-                                session.state.update(state.to_dict())
-                                logger.info(f"[{session_id}] Updated state with user message: '{data}' | Stage: {state.conversation_stage.value}")
-                        except Exception as e:
-                            logger.warning(f"[{session_id}] Could not update state with user message: {e}")
-
-                    # Send the message to the agent
+                    # Text: track it on the live state, then send it to the agent
                     if mime_type == "text/plain":
-                        content = Content(role="user", parts=[Part.from_text(text=data)])
-                        live_request_queue.send_content(content=content)
-                        logger.info(f"[{session_id}] Client to agent - text: {data}")
-                        
-                    elif mime_type == "audio/pcm":
-                        decoded_data = base64.b64decode(data)
-                        live_request_queue.send_realtime(Blob(data=decoded_data, mime_type=mime_type))
-                        logger.debug(f"[{session_id}] Client to agent - audio/pcm: {len(decoded_data)} bytes")
-                        
-                    elif mime_type == "image/jpeg":
-                        decoded_data = base64.b64decode(data)
-                        live_request_queue.send_realtime(Blob(data=decoded_data, mime_type=mime_type))
-                        logger.info(f"[{session_id}] Client to agent - image/jpeg: {len(decoded_data)} bytes")
-
-                    elif mime_type.startswith("image/") or mime_type.startswith("video/"):
-                        decoded_data = base64.b64decode(data)
-                        live_request_queue.send_realtime(Blob(data=decoded_data, mime_type=mime_type))
-                        logger.info(f"[{session_id}] Client to agent - {mime_type}: {len(decoded_data)} bytes")
+                        alia_state.update_interaction(user_message=data)
+                        live_request_queue.send_content(content=_user_text(data))
+                        logger.info("[%s] Client to agent - text: '%s' | Interactions: %s", session_id, data, alia_state.interaction_count)
+                        continue
 
-                    else:
-                        logger.warning(f"[{session_id}] Unsupported mime type: {mime_type}")
+                    # Media: send it to the agent
+                    handler = _message_handler(mime_type)
+                    if handler is None:
+                        logger.warning("[%s] Unsupported mime type: %s", session_id, mime_type)
+                        continue
+                    size = handler(live_request_queue, mime_type, data)
+                    logger.debug("[%s] Client to agent - %s: %d bytes", session_id, mime_type, size)
 
             except WebSocketDisconnect:
-                logger.info(f"[{session_id}] Client disconnected")
+                logger.info("[%s] Client disconnected", session_id)
                 if live_request_queue:
                     live_request_queue.close()
             except asyncio.CancelledError:
-                logger.info(f"[{session_id}] Client to agent task cancelled")
+                logger.info("[%s] Client to agent task cancelled", session_id)
             except Exception as e:
-                logger.error(f"[{session_id}] Error in client_to_agent: {e}")
+                logger.error("[%s] Error in client_to_agent: %s", session_id, e)
 
         # Start communication tasks
-        logger.info(f"[{session_id}] Starting communication bridge tasks")
-        agent_task = asyncio.create_task(agent_to_client())
-        client_task = asyncio.create_task(client_to_agent())
-        
-        done, pending = await asyncio.wait(
-            [agent_task, client_task],
-            return_when=asyncio.FIRST_COMPLETED
-        )
-
-        # Cancel remaining tasks
-        for task in pending:
-            if not task.done():
-                task.cancel()
-                with suppress(asyncio.CancelledError):
-                    await task
+        logger.info("[%s] Starting communication bridge tasks", session_id)
+        # The writer finishes once the agent stream ends and everything
+        # queued before it has been sent; the reader finishes on disconnect.
+        # Either one finishing cancels the rest of the bridge.
+        async with asyncio.TaskGroup() as tg:
+            agent_task = tg.create_task(agent_to_client())
+            writer_task = tg.create_task(client_writer())
+            client_task = tg.create_task(client_to_agent())
+
+            def stop_bridge(_):
+                for task in (agent_task, writer_task, client_task):
+                    task.cancel()
+
+            writer_task.add_done_callback(stop_bridge)
+            client_task.add_done_callback(stop_bridge)
 
     except WebSocketDisconnect:
-        logger.info(f"[{session_id}] WebSocket disconnected gracefully")
+        logger.info("[%s] WebSocket disconnected gracefully", session_id)
     except Exception as e:
-        logger.error(f"[{session_id}] WebSocket error: {e}")
+        logger.error("[%s] WebSocket error: %s", session_id, e)
         try:
             error_message = {
                 "mime_type": "text/plain",
                 "data": f"Sorry, there was an error: {str(e)}"
             }
-            await websocket.send_text(json.dumps(error_message))
+            await websocket.send_bytes(encode(error_message))
         except:
             pass
     finally:
         # Cleanup
-        logger.info(f"[{session_id}] Performing cleanup")
+        logger.info("[%s] Performing cleanup", session_id)
         if live_request_queue:
             try:
                 live_request_queue.close()
             except Exception as e:
-                logger.warning(f"[{session_id}] Error closing queue: {e}")
+                logger.warning("[%s] Error closing queue: %s", session_id, e)
         
         if session:
             try:
-                if session.state:
-                    final_state = ALIASessionState.from_dict(session.state)
-                    logger.info(f"[{session_id}] Session end - final state: {final_state.get_summary()}")
+                # Flush interactions tracked since the last turn boundary
+                if alia_state is not None:
+                    StateManager.save_state_to_adk(session, alia_state)
+                if session.state and logger.isEnabledFor(logging.INFO):
+                    logger.info("[%s] Session end - final state: %s", session_id, StateManager.summary_from_adk(session.state))
             except Exception as e:
-                logger.warning(f"[{session_id}] Could not finalize session state: {e}")
+                logger.warning("[%s] Could not finalize session state: %s", session_id, e)
         
-        logger.info(f"[{session_id}] Client fully disconnected")
+        logger.info("[%s] Client fully disconnected", session_id)
 
 # Static files and routes
 if not STATIC_DIR.is_dir():
@@ -350,10 +628,25 @@ if not STATIC_DIR.is_dir():
 else:
     app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
+# The page shell is small and never changes while the server runs, so it
+# is read once and served from memory
+INDEX_HTML = None
+INDEX_HEADERS = {}
+if os.path.isfile(INDEX_PATH):
+    INDEX_HTML = Path(INDEX_PATH).read_bytes()
+    INDEX_HEADERS = {
+        "ETag": f'"{hashlib.md5(INDEX_HTML, usedforsecurity=False).hexdigest()}"',
+        "Cache-Control": "public, max-age=60",
+    }
+
 @app.get("/")
-async def root():
-    """Serves the index.html"""
-    return FileResponse(os.path.join(STATIC_DIR, "index.html"))
+async def root(request: Request):
+    """Serves the index.html, answering revalidations with 304"""
+    if INDEX_HTML is None:
+        return FileResponse(INDEX_PATH)
+    if request.headers.get("if-none-match") == INDEX_HEADERS["ETag"]:
+        return Response(status_code=304, headers=INDEX_HEADERS)
+    return Response(content=INDEX_HTML, media_type="text/html", headers=INDEX_HEADERS)
 
 @app.get("/health")
 async def health_check():
@@ -384,5 +677,14 @@ if __name__ == "__main__":
     # Environment-based configuration
     host = os.getenv("PHYSIO_AI_HOST", "0.0.0.0")
     port = int(os.getenv("PHYSIO_AI_PORT", "8000"))
+    # "auto" picks uvloop when it is installed (not on Windows)
+    loop = os.getenv("PHYSIO_AI_LOOP", "auto")
+    # Opt-in multi-process serving; sessions live in each worker's
+    # InMemoryRunner and a websocket stays pinned to the worker that accepted it
+    workers = int(os.getenv("PHYSIO_AI_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
     
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    if workers == 1:
+        # Serve this module's app directly rather than importing main a second time
+        uvicorn.run(app, host=host, port=port, loop=loop, http="httptools")
+    else:
+        uvicorn.run("main:app", host=host, port=port, workers=workers, loop=loop, http="httptools")
\ No newline at end of file
@@ -1,6 +1,11 @@
+import functools
+import logging
+import re
+
 from google.adk.agents import LlmAgent
 from google.adk.tools.agent_tool import AgentTool
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.models import LlmResponse
 from typing import Optional
 
@@ -8,6 +13,14 @@ from .state_schema import (
     ALIASessionState, ConversationStage
 )
 
+logger = logging.getLogger(__name__)
+
+# Sentinels the specialist agents end their responses with; matched
+# case-insensitively on the raw text, without a lower-cased copy
+CATEGORY_OTHER = re.compile(r"category:\s*other", re.IGNORECASE)
+CONSENT_NO = re.compile(r"consent:\s*no", re.IGNORECASE)
+SEVERITY_EXTREME = re.compile(r"severity:\s*extreme", re.IGNORECASE)
+
 
 # ============================================================================
 # Callback functions to update state 
@@ -15,48 +28,36 @@ from .state_schema import (
 
 
 def _transition_state(callback_context: CallbackContext, new_stage: ConversationStage, reason: str = ""):
-    """Helper function to update the state."""
-    current_state = ALIASessionState.from_dict(callback_context.state.to_dict())
-    current_state.transition_to_stage(new_stage, reason)
-    callback_context.state.update(current_state.to_dict())
-    print(f"[CALLBACK] Stage updated to: {current_state.conversation_stage.value}")
+    """Helper function to update the state, writing only the keys that change."""
+    delta = ALIASessionState.transition_delta(new_stage, reason)
+    state = callback_context.state
+    # Callbacks fire on every model response, often without a stage change
+    if all(state.get(key) == value for key, value in delta.items()):
+        return
+    state.update(delta)
+    logger.info("[CALLBACK] Stage updated to: %s", new_stage.value)
 
 
 def after_greeting_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
     _transition_state(callback_context, ConversationStage.PAIN_ANALYSIS)
 
-def after_pain_analysis_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
-    # CORRECT: We now have direct access to llm_response
-    agent_output = llm_response.content.parts[0].text.lower()
-    if "category: other" in agent_output:
-        reason = "User's pain is not related to the lower back."
-        _transition_state(callback_context, ConversationStage.CLOSURE, reason)
-    else:
-        _transition_state(callback_context, ConversationStage.CONSENT_QUIZ)
-
-def after_consent_quiz_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
-    agent_output = llm_response.content.parts[0].text.lower()
-    if "consent: no" in agent_output:
-        reason = "User declined the assessment quiz."
-        _transition_state(callback_context, ConversationStage.CLOSURE, reason)
-    else:
-        _transition_state(callback_context, ConversationStage.ASSESSMENT_QUIZ)
-
-def after_assessment_quiz_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
-    agent_output = llm_response.content.parts[0].text.lower()
-    if "severity: extreme" in agent_output:
-        reason = "User reported extreme pain and was advised to see a doctor."
-        _transition_state(callback_context, ConversationStage.CLOSURE, reason)
-    else:
-        _transition_state(callback_context, ConversationStage.CONSENT_EXERCISE)
-
-def after_consent_exercise_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
-    agent_output = llm_response.content.parts[0].text.lower()
-    if "consent: no" in agent_output:
-        reason = "User declined the exercise session."
-        _transition_state(callback_context, ConversationStage.CLOSURE, reason)
-    else:
-        _transition_state(callback_context, ConversationStage.EXERCISE_GUIDANCE)
+def _sentinel_model_callback(exit_sentinel: re.Pattern, exit_reason: str, next_stage: ConversationStage):
+    """Build an after_model callback: close the session if the sentinel appears, else advance."""
+    def callback(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
+        if exit_sentinel.search(llm_response.content.parts[0].text):
+            _transition_state(callback_context, ConversationStage.CLOSURE, exit_reason)
+        else:
+            _transition_state(callback_context, next_stage)
+    return callback
+
+after_pain_analysis_model_callback = _sentinel_model_callback(
+    CATEGORY_OTHER, "User's pain is not related to the lower back.", ConversationStage.CONSENT_QUIZ)
+after_consent_quiz_model_callback = _sentinel_model_callback(
+    CONSENT_NO, "User declined the assessment quiz.", ConversationStage.ASSESSMENT_QUIZ)
+after_assessment_quiz_model_callback = _sentinel_model_callback(
+    SEVERITY_EXTREME, "User reported extreme pain and was advised to see a doctor.", ConversationStage.CONSENT_EXERCISE)
+after_consent_exercise_model_callback = _sentinel_model_callback(
+    CONSENT_NO, "User declined the exercise session.", ConversationStage.EXERCISE_GUIDANCE)
 
 # Exercise guidance does not need to parse output, so after_agent is fine
 def after_exercise_guidance_callback(callback_context: CallbackContext) -> None:
@@ -151,11 +152,7 @@ closure_tool = AgentTool(agent=closure_agent)
 # ROOT LLM ORCHESTRATOR AGENT
 # =============================================================================
 
-root_agent = LlmAgent(
-    name="ALIA_Orchestrator",
-    model="gemini-2.0-flash-exp",
-    description="ALIA - AI Lower-back Intelligence Assistant for physiotherapy assessment",
-    instruction="""
+ORCHESTRATOR_INSTRUCTION = """
     You are the master orchestrator for ALIA, a physiotherapy AI.
     Your ONLY job is to check the current conversation stage and call the correct specialist tool.
     You MUST NOT respond directly to the user. You MUST call one of the provided tools.
@@ -169,7 +166,22 @@ root_agent = LlmAgent(
     - If stage is 'consent_exercise', you MUST call the `consent_exercise_agent` tool.
     - If stage is 'exercise_guidance', you MUST call the `exercise_guidance_agent` tool.
     - If stage is 'closure', you MUST call the `closure_agent` tool.
-    """,
+    """
+
+# Only the stage varies, so each stage's instruction is rendered once
+# instead of templating session state into it on every request
+@functools.lru_cache(maxsize=16)
+def _render_orchestrator_instruction(stage: str) -> str:
+    return ORCHESTRATOR_INSTRUCTION.replace("{conversation_stage}", stage)
+
+def orchestrator_instruction(context: ReadonlyContext) -> str:
+    return _render_orchestrator_instruction(context.state["conversation_stage"])
+
+root_agent = LlmAgent(
+    name="ALIA_Orchestrator",
+    model="gemini-2.0-flash-exp",
+    description="ALIA - AI Lower-back Intelligence Assistant for physiotherapy assessment",
+    instruction=orchestrator_instruction,
     tools=[
         greeting_tool,
         pain_analysis_tool,
@@ -180,34 +192,3 @@ root_agent = LlmAgent(
         closure_tool
     ]
 )
-
-# root_agent = LlmAgent(
-#     name="ALIA",
-#     model="gemini-2.0-flash-exp",
-#     description="ALIA - AI Lower-back Intelligence Assistant for physiotherapy assessment",
-#     instruction="""
-# You are ALIA (AI Lower-back Intelligence Assistant), a specialized physiotherapy agent.
-
-# Your mission:
-# 1. Help users with lower back pain through structured assessment
-# 2. Provide professional, empathetic care
-# 3. Guide users through a logical conversation flow
-# 4. Respect user boundaries and choices
-
-# Current conversation stage: {conversation_stage}
-# Interaction count: {interaction_count}
-
-# Based on the current stage, respond appropriately:
-# - If GREETING stage: Use the greeting tool to properly introduce yourself
-# - If PAIN_ANALYSIS stage: Use the pain analysis tool to determine if they have lower back pain
-# - Otherwise: Provide helpful guidance about lower back pain
-
-# You have access to specialized tools:
-# - greeting_tool: For initial greetings and introductions
-# - pain_analysis_tool: For analyzing pain location and type
-
-# Always maintain a professional, caring, and knowledgeable demeanor.
-# """,
-#     tools=[greeting_tool, pain_analysis_tool],
-#     output_key="alia_response"
-# )
\ No newline at end of file
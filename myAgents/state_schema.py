@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, Set
 from enum import Enum
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -13,7 +13,14 @@ class ConversationStage(Enum):
     EXERCISE_GUIDANCE = "exercise_guidance"
     CLOSURE = "closure"
 
-@dataclass
+# Constant head of each stage's summary line, so summaries only format the count
+_SUMMARY_PREFIX = {stage.value: f"Stage: {stage.value} | Interactions: " for stage in ConversationStage}
+
+def _format_summary(stage: str, interaction_count: int) -> str:
+    """Summary line for a stored stage value and interaction count"""
+    return f"{_SUMMARY_PREFIX[stage]}{interaction_count}"
+
+@dataclass(slots=True)
 class ALIASessionState:
     """Simplified session state for ALIA physiotherapy agent"""
     
@@ -28,6 +35,16 @@ class ALIASessionState:
     last_user_message: str = ""
     session_start_time: str = field(default_factory=lambda: datetime.now().isoformat())
     
+    # Fields assigned since the last save, so saves write only what changed
+    _dirty: Set[str] = field(default_factory=set, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name: str, value: Any):
+        # Assignments made while __init__ runs come before _dirty exists
+        dirty = getattr(self, "_dirty", None)
+        object.__setattr__(self, name, value)
+        if dirty is not None:
+            dirty.add(name)
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for ADK state storage"""
         return {
@@ -38,19 +55,12 @@ class ALIASessionState:
             "session_start_time": self.session_start_time
         }
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'ALIASessionState':
-        """Create from dictionary (from ADK state)"""
-        valid_keys = {
-            'conversation_stage', 'closure_reason', 'interaction_count', 
-            'last_user_message', 'session_start_time'
-        }
-        filtered_data = {k: v for k, v in data.items() if k in valid_keys}
-        
-        if 'conversation_stage' in filtered_data and isinstance(filtered_data['conversation_stage'], str):
-            filtered_data['conversation_stage'] = ConversationStage(filtered_data['conversation_stage'])
-        
-        return cls(**filtered_data)
+    def to_delta(self) -> Dict[str, Any]:
+        """Only the fields assigned since the last save, in to_dict form"""
+        delta = {name: getattr(self, name) for name in self._dirty}
+        if "conversation_stage" in delta:
+            delta["conversation_stage"] = self.conversation_stage.value
+        return delta
     
     def update_interaction(self, user_message: str = ""):
         """Update interaction tracking"""
@@ -58,16 +68,18 @@ class ALIASessionState:
         if user_message:
             self.last_user_message = user_message
     
-    def transition_to_stage(self, new_stage: ConversationStage, reason: str = ""):
-        """Transition to new conversation stage"""
-        self.conversation_stage = new_stage
+    @staticmethod
+    def transition_delta(new_stage: ConversationStage, reason: str = "") -> Dict[str, Any]:
+        """State keys a stage transition changes, for writing back without a round-trip"""
+        delta = {"conversation_stage": new_stage.value}
         if reason:
-            self.closure_reason = reason
+            delta["closure_reason"] = reason
+        return delta
             
     # ADD THIS METHOD
     def get_summary(self) -> str:
         """Generate a simple session summary for logging."""
-        return f"Stage: {self.conversation_stage.value} | Interactions: {self.interaction_count}"
+        return _format_summary(self.conversation_stage.value, self.interaction_count)
 
 class StateManager:
     """Simple helper class for managing ALIA session state"""
@@ -79,7 +91,15 @@ class StateManager:
         # but the method signature matches what main.py expects.
         return ALIASessionState()
     
+    @staticmethod
+    def summary_from_adk(state: Dict[str, Any]) -> str:
+        """get_summary() read straight from ADK state, without building the dataclass"""
+        return _format_summary(state["conversation_stage"], state["interaction_count"])
+    
     @staticmethod
     def save_state_to_adk(callback_context, state: ALIASessionState):
-        """Save state back to ADK context"""
-        callback_context.state.update(state.to_dict())
\ No newline at end of file
+        """Save changed fields back to ADK context (or an ADK session)"""
+        delta = state.to_delta()
+        if delta:
+            callback_context.state.update(delta)
+            state._dirty.clear()
\ No newline at end of file
@@ -29,6 +29,27 @@ const ws_url =
 let websocket = null;
 let is_audio = false;
 
+// JSON messages travel as binary (UTF-8) frames in both directions
+const textDecoder = new TextDecoder();
+const textEncoder = new TextEncoder();
+
+// Binary media frames start with a one-byte type tag (see main.py)
+const FRAME_AUDIO_PCM = 0x01;
+const FRAME_IMAGE_JPEG = 0x02;
+const FRAME_AUDIO_PCMU = 0x07;
+
+// Agent audio as 16-bit PCM ("pcm") or 8-bit mu-law ("pcmu", half the
+// bandwidth), chosen with ?audio_codec= on the page URL
+const audioCodec =
+  new URLSearchParams(window.location.search).get("audio_codec") || "pcm";
+
+// G.711 mu-law byte to 16-bit PCM sample
+const ULAW_TO_PCM = new Int16Array(256).map((_, i) => {
+  const u = ~i & 0xff;
+  const t = (((u & 0x0f) << 3) + 0x84) << ((u & 0x70) >> 4);
+  return u & 0x80 ? 0x84 - t : t - 0x84;
+});
+
 // Get DOM elements
 const messageForm = document.getElementById("messageForm");
 const messageInput = document.getElementById("message");
@@ -38,7 +59,10 @@ let currentMessageId = null;
 // WebSocket handlers
 function connectWebsocket() {
   // Connect websocket
-  websocket = new WebSocket(ws_url + "?is_audio=" + is_audio);
+  websocket = new WebSocket(
+    ws_url + "?is_audio=" + is_audio + "&audio_codec=" + audioCodec
+  );
+  websocket.binaryType = "arraybuffer";
 
   // Handle connection open
   websocket.onopen = function () {
@@ -53,8 +77,31 @@ function connectWebsocket() {
 
   // Handle incoming messages
   websocket.onmessage = function (event) {
+    // Tagged binary audio frame: play the raw PCM directly
+    const tag =
+      event.data instanceof ArrayBuffer ? new Uint8Array(event.data, 0, 1)[0] : null;
+    if (tag === FRAME_AUDIO_PCM) {
+      if (audioPlayerNode) {
+        audioPlayerNode.port.postMessage(event.data.slice(1));
+      }
+      return;
+    }
+    if (tag === FRAME_AUDIO_PCMU) {
+      if (audioPlayerNode) {
+        const ulaw = new Uint8Array(event.data, 1);
+        const pcm = new Int16Array(ulaw.length);
+        for (let i = 0; i < ulaw.length; i++) {
+          pcm[i] = ULAW_TO_PCM[ulaw[i]];
+        }
+        audioPlayerNode.port.postMessage(pcm.buffer, [pcm.buffer]);
+      }
+      return;
+    }
+
     // Parse the incoming message
-    const message_from_server = JSON.parse(event.data);
+    const message_from_server = JSON.parse(
+      typeof event.data === "string" ? event.data : textDecoder.decode(event.data)
+    );
     console.log("[AGENT TO CLIENT] ", message_from_server);
 
     // Check if the turn is complete
@@ -79,11 +126,6 @@ function connectWebsocket() {
       return;
     }
 
-    // If it's audio, play it
-    if (message_from_server.mime_type == "audio/pcm" && audioPlayerNode) {
-      audioPlayerNode.port.postMessage(base64ToArray(message_from_server.data));
-    }
-
     // If it's a text, print it
     if (message_from_server.mime_type == "text/plain") {
       // add a new message for a new turn
@@ -141,23 +183,19 @@ function addSubmitHandler() {
   };
 }
 
-// Send a message to the server as a JSON string
+// Send a message to the server as UTF-8 encoded JSON
 function sendMessage(message) {
   if (websocket && websocket.readyState == WebSocket.OPEN) {
     const messageJson = JSON.stringify(message);
-    websocket.send(messageJson);
+    websocket.send(textEncoder.encode(messageJson));
   }
 }
 
-// Decode Base64 data to Array
-function base64ToArray(base64) {
-  const binaryString = window.atob(base64);
-  const len = binaryString.length;
-  const bytes = new Uint8Array(len);
-  for (let i = 0; i < len; i++) {
-    bytes[i] = binaryString.charCodeAt(i);
+// Send raw binary data (a tagged media frame) to the server
+function sendBinary(data) {
+  if (websocket && websocket.readyState == WebSocket.OPEN) {
+    websocket.send(data);
   }
-  return bytes.buffer;
 }
 
 /**
@@ -228,20 +266,18 @@ function sendBufferedAudio() {
     totalLength += chunk.length;
   }
   
-  // Combine all chunks into a single buffer
-  const combinedBuffer = new Uint8Array(totalLength);
-  let offset = 0;
+  // Combine all chunks into a single tagged frame
+  const combinedBuffer = new Uint8Array(totalLength + 1);
+  combinedBuffer[0] = FRAME_AUDIO_PCM;
+  let offset = 1;
   for (const chunk of audioBuffer) {
     combinedBuffer.set(chunk, offset);
     offset += chunk.length;
   }
   
-  // Send the combined audio data
-  sendMessage({
-    mime_type: "audio/pcm",
-    data: arrayBufferToBase64(combinedBuffer.buffer),
-  });
-  console.log("[CLIENT TO AGENT] sent %s bytes", combinedBuffer.byteLength);
+  // Send the combined audio data as a binary frame
+  sendBinary(combinedBuffer.buffer);
+  console.log("[CLIENT TO AGENT] sent %s bytes", totalLength);
   
   // Clear the buffer
   audioBuffer = [];
@@ -260,17 +296,6 @@ function stopAudioRecording() {
   }
 }
 
-// Encode an array buffer with Base64
-function arrayBufferToBase64(buffer) {
-  let binary = "";
-  const bytes = new Uint8Array(buffer);
-  const len = bytes.byteLength;
-  for (let i = 0; i < len; i++) {
-    binary += String.fromCharCode(bytes[i]);
-  }
-  return window.btoa(binary);
-}
-
 // ==================================================================
 // NEW: Video Sharing Functionality
 // ==================================================================
@@ -329,40 +354,53 @@ async function toggleVideoSharing() {
     }
 }
 
+// Frames are scaled down to fit this size before encoding; the model does
+// not need full camera resolution
+const MAX_FRAME_WIDTH = 640;
+const MAX_FRAME_HEIGHT = 480;
+
+// Skip a frame while this much earlier data is still waiting to be sent
+const MAX_BUFFERED_BYTES = 256 * 1024;
+
 function sendVideoFrame() {
     if (!videoStream || videoFeed.paused || videoFeed.ended) {
         return;
     }
+    if (!websocket || websocket.bufferedAmount > MAX_BUFFERED_BYTES) {
+        return;
+    }
 
     const captureCtx = captureCanvas.getContext('2d');
     const sentFrameCtx = sentFrameCanvas.getContext('2d');
     
-    // Set canvas dimensions to match video to avoid distortion
-    const videoWidth = videoFeed.videoWidth;
-    const videoHeight = videoFeed.videoHeight;
-    if (captureCanvas.width !== videoWidth || captureCanvas.height !== videoHeight) {
-        captureCanvas.width = videoWidth;
-        captureCanvas.height = videoHeight;
-        sentFrameCanvas.width = videoWidth;
-        sentFrameCanvas.height = videoHeight;
+    // Size the canvases to the scaled frame, keeping the aspect ratio
+    const scale = Math.min(
+        1,
+        MAX_FRAME_WIDTH / videoFeed.videoWidth,
+        MAX_FRAME_HEIGHT / videoFeed.videoHeight
+    );
+    const frameWidth = Math.round(videoFeed.videoWidth * scale);
+    const frameHeight = Math.round(videoFeed.videoHeight * scale);
+    if (captureCanvas.width !== frameWidth || captureCanvas.height !== frameHeight) {
+        captureCanvas.width = frameWidth;
+        captureCanvas.height = frameHeight;
+        sentFrameCanvas.width = frameWidth;
+        sentFrameCanvas.height = frameHeight;
     }
     
     // Draw the current video frame onto the hidden canvas
-    captureCtx.drawImage(videoFeed, 0, 0, videoWidth, videoHeight);
+    captureCtx.drawImage(videoFeed, 0, 0, frameWidth, frameHeight);
 
     // Draw the captured frame to the visible canvas for user feedback
-    sentFrameCtx.drawImage(captureCanvas, 0, 0, videoWidth, videoHeight);
+    sentFrameCtx.drawImage(captureCanvas, 0, 0, frameWidth, frameHeight);
     
-    // Get the frame as a JPEG image in Base64
+    // Encode the frame as JPEG and send it as a tagged binary frame
     // The quality parameter (0.7) can be adjusted to balance quality and file size
-    const dataUrl = captureCanvas.toDataURL('image/jpeg', 0.7);
-    const base64Data = dataUrl.split(',')[1];
-
-    // Send the frame data over the WebSocket
-    sendMessage({
-        mime_type: 'image/jpeg',
-        data: base64Data,
-    });
-
-    console.log(`[CLIENT TO AGENT] Sent video frame (${base64Data.length} bytes)`);
+    captureCanvas.toBlob((jpegBlob) => {
+        if (!jpegBlob) {
+            return;
+        }
+        sendBinary(new Blob([new Uint8Array([FRAME_IMAGE_JPEG]), jpegBlob]));
+        console.log(`[CLIENT TO AGENT] Sent video frame (${jpegBlob.size} bytes)`);
+    }, 'image/jpeg', 0.7);
 }
\ No newline at end of file